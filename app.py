@@ -2,23 +2,113 @@
 """Analista Quantitativo de Apostas Esportivas (XG) - VS Code (GEMINI)"""
 
 import os
+import atexit
+import re
+import pathlib
 import json
+import asyncio
+import concurrent.futures
+import gzip
+import hashlib
+import sys
+import tempfile
+import time
+import math
+import queue
 import logging
-from datetime import datetime
-from typing import Dict, List, Optional, Any
-from dataclasses import dataclass
+import logging.handlers
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterator, List, Optional, Any, Tuple
+from collections import defaultdict
+from functools import partial
+from dataclasses import dataclass, field
 from enum import Enum
 
-import google.generativeai as genai
-from flask import Flask, request, jsonify
-from dotenv import load_dotenv
-
-# Carrega as variáveis do arquivo .env (como GOOGLE_API_KEY)
-# Isso agora roda assim que o Gunicorn importa o arquivo.
-load_dotenv()
+from cachetools import TTLCache
+import click
+import jinja2
+import numpy as np
+import orjson
+import requests
+from flask import Flask, Response, request, stream_with_context
+from flask.json.provider import JSONProvider
+from flask_caching import Cache
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional: sem ele a página inicial sai apenas em gzip
+    brotli = None
+
+try:
+    import minify_html
+except ImportError:  # minify-html é opcional: sem ele a página inicial sai como está no template
+    minify_html = None
+
+# google.generativeai (gRPC/protobuf) e dotenv são importados sob demanda:
+# ver AnalistaQuantitativoXG.__init__ e inicializar_app.
+
+# Configura o logging uma única vez, na importação do módulo. A escrita (console e,
+# com LOG_ARQUIVO definido, arquivo) fica numa thread própria: nas rotas, logger.error()
+# é só um put na fila. queue.Queue (e não SimpleQueue, em C) coopera com o gevent.
+if not logging.getLogger().handlers:
+    _fila_logs = queue.Queue(-1)
+    _handlers_logs = [logging.StreamHandler()]
+    if os.getenv("LOG_ARQUIVO"):
+        _handlers_logs.append(logging.FileHandler(os.getenv("LOG_ARQUIVO"), encoding="utf-8"))
+    for _handler in _handlers_logs:
+        _handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    # Na fila vai só a mensagem já interpolada; data/nível são formatados pelos handlers de saída
+    _handler_fila = logging.handlers.QueueHandler(_fila_logs)
+    _handler_fila.setFormatter(logging.Formatter('%(message)s'))
+    logging.basicConfig(level=logging.INFO, handlers=[_handler_fila])
+    _listener_logs = logging.handlers.QueueListener(_fila_logs, *_handlers_logs, respect_handler_level=True)
+    _listener_logs.start()
+    atexit.register(_listener_logs.stop)
 
 app = Flask(__name__)
+cache = Cache()
+# A página inicial fica 5 min nos caches (navegador/proxy) e depois é revalidada pelo ETag;
+# os arquivos de static/ são sempre referenciados com ?v=<hash do conteúdo>, então podem ficar por 1 ano
+HOME_CACHE_MAX_AGE = 300
+app.config["SEND_FILE_MAX_AGE_DEFAULT"] = 365 * 24 * 60 * 60
+# Templates não mudam em produção: dispensa o stat do arquivo a cada renderização
+app.config["TEMPLATES_AUTO_RELOAD"] = False
+app.jinja_env.auto_reload = False
 analista_instance = None
+_analista_lock = threading.Lock()
+
+# Modelos com suporte a Context Caching (exigem versão explícita): Flash por padrão,
+# Pro apenas quando o Flash reporta confiança baixa ou EV marginal
+MODELO_GEMINI_RAPIDO = "models/gemini-1.5-flash-002"
+MODELO_GEMINI_PRO = "models/gemini-1.5-pro-002"
+EV_LIMITE_ESCALONAMENTO = 0.03
+# Tempo de vida do prefixo estático (instrução de sistema + RAG) no cache do Gemini
+CACHE_TTL = timedelta(hours=1)
+# Mínimo de tokens aceito pela API para um CachedContent (Gemini 1.5); abaixo disso nem tenta criar
+CACHE_MIN_TOKENS = 32768
+# Cache local de respostas (mesma partida + mesmas odds + mesmo contexto)
+RESP_CACHE_MAXSIZE = 1024
+RESP_CACHE_TTL_SEGUNDOS = 600
+# Cache compartilhado entre workers/processos (L2, ativo quando REDIS_URL está definido)
+CACHE_COMPARTILHADO_TTL_SEGUNDOS = 3600
+# Orçamento de tokens de saída: base + adicional por mercado com odds informadas
+TOKENS_SAIDA_BASE = 512
+TOKENS_SAIDA_POR_MERCADO = 600
+# Lote assíncrono: chamadas simultâneas ao Gemini (respeita a cota de RPM) e tamanho máximo
+BATCH_CONCORRENCIA_MAXIMA = 8
+BATCH_TAMANHO_MAXIMO = 50
+# Espera máxima pelo lote no loop asyncio (abaixo do timeout do worker do gunicorn)
+BATCH_TIMEOUT_SEGUNDOS = 100
+# Batch Mode do Gemini (lotes diferidos: ~50% do custo, conclusão em até 24h)
+GEMINI_API_URL = "https://generativelanguage.googleapis.com"
+LOTE_DIFERIDO_INTERVALO_POLL = 30
+LOTE_DIFERIDO_TIMEOUT = 24 * 60 * 60
+# Poisson local: placares de 0 a POISSON_MAX_GOLS-1 por time e correção Dixon-Coles para placares baixos.
+# Com xG até XG_MAXIMO a massa fora da grade é desprezível (< 1e-4) e o fator 1 + xG*rho continua positivo.
+POISSON_MAX_GOLS = 16
+DIXON_COLES_RHO = -0.10
+XG_MAXIMO = 5.0
 
 
 # ============================================================================
@@ -27,43 +117,172 @@ analista_instance = None
 # AnalistaQuantitativoXG permanece o mesmo. Cole-o aqui.)
 # ============================================================================
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ConsultaAposta:
-    """Estrutura de dados para consulta de aposta"""
+    """
+    Estrutura de dados para consulta de aposta (imutável).
+    Igualdade e hash ignoram o timestamp; os dicts de odds entram só na igualdade.
+    """
     liga: str
     time_casa: str
     time_fora: str
-    odds_1x2: Optional[Dict[str, float]] = None
-    odds_over_under: Optional[Dict[str, float]] = None
-    odds_btts: Optional[Dict[str, float]] = None
+    odds_1x2: Optional[Dict[str, float]] = field(default=None, hash=False)
+    odds_over_under: Optional[Dict[str, float]] = field(default=None, hash=False)
+    odds_btts: Optional[Dict[str, float]] = field(default=None, hash=False)
     contexto_adicional: Optional[str] = None
-    timestamp: datetime = None
+    xg_casa: Optional[float] = None
+    xg_fora: Optional[float] = None
+    timestamp: datetime = field(default_factory=datetime.now, compare=False)
 
-    def __post_init__(self):
-        if self.timestamp is None:
-            self.timestamp = datetime.now()
-
-class TipoMercado(Enum):
+class TipoMercado(str, Enum):
     """Tipos de mercado suportados"""
     RESULTADO_1X2 = "1x2"
     OVER_UNDER = "over_under"
     BTTS = "btts"
     AMBOS_MARCAM = "ambos_cam"
 
+# Parte variável do Prompt Mestre, compilada uma única vez na importação
+_PROMPT_DADOS_PARTIDA = jinja2.Template("""#DATA_INPUT_TEMPLATE
+- Liga/Campeonato: {{ liga }}
+- Partida: {{ time_casa }} vs {{ time_fora }}
+- Odds de Mercado:
+{{ odds_formatadas }}
+{{ linha_contexto }}
+{% if probabilidades %}
+#P_C_POISSON_LOCAL
+A Probabilidade Real ($P_c$) já foi calculada localmente por Poisson Bivariado com correção Dixon-Coles, a partir do xG esperado (Casa {{ xg_casa }} | Fora {{ xg_fora }}). Use estes valores no COT_STEP_3 em vez de recalculá-los:
+  • 1X2: Casa {{ probabilidades.casa }} | Empate {{ probabilidades.empate }} | Fora {{ probabilidades.fora }}
+  • Over/Under 2.5: Over {{ probabilidades.over }} | Under {{ probabilidades.under }}
+  • BTTS: Sim {{ probabilidades.btts_sim }} | Não {{ probabilidades.btts_nao }}
+{% endif %}
+AGORA, INICIE A ANÁLISE SEGUINDO RIGOROSAMENTE OS 5 PASSOS CoT:
+""", keep_trailing_newline=True)
+
+# ============================================================================
+# MODELO DE POISSON LOCAL
+# ============================================================================
+
+_GOLS = np.arange(POISSON_MAX_GOLS)
+_FATORIAIS = np.array([math.factorial(k) for k in range(POISSON_MAX_GOLS)], dtype=float)
+
+def _grade_poisson(lam_casa: float, lam_fora: float, rho: float = DIXON_COLES_RHO) -> np.ndarray:
+    """
+    Matriz P(gols_casa = i, gols_fora = j) de dois Poisson independentes,
+    com a correção Dixon-Coles (tau) nos placares 0x0, 0x1, 1x0 e 1x1.
+    """
+    pmf_casa = np.exp(-lam_casa) * lam_casa ** _GOLS / _FATORIAIS
+    pmf_fora = np.exp(-lam_fora) * lam_fora ** _GOLS / _FATORIAIS
+    grade = pmf_casa[:, None] * pmf_fora[None, :]
+
+    grade[0, 0] *= 1 - lam_casa * lam_fora * rho
+    grade[0, 1] *= 1 + lam_casa * rho
+    grade[1, 0] *= 1 + lam_fora * rho
+    grade[1, 1] *= 1 - rho
+
+    return grade / grade.sum()
+
+def _probabilidades_poisson(lam_casa: float, lam_fora: float) -> Dict[str, float]:
+    """P_c dos mercados 1X2, Over/Under 2.5 e BTTS a partir do xG esperado de cada time"""
+    grade = _grade_poisson(lam_casa, lam_fora)
+    total_gols = _GOLS[:, None] + _GOLS[None, :]
+    over = float(grade[total_gols > 2].sum())
+    btts_sim = float(grade[1:, 1:].sum())
+    return {
+        "casa": float(np.tril(grade, -1).sum()),
+        "empate": float(np.trace(grade)),
+        "fora": float(np.triu(grade, 1).sum()),
+        "over": over,
+        "under": 1 - over,
+        "btts_sim": btts_sim,
+        "btts_nao": 1 - btts_sim
+    }
+
+# Linha de cada mercado no prompt (odds ausentes aparecem como N/A)
+def _formatar_1x2(consulta: ConsultaAposta) -> Optional[str]:
+    if consulta.odds_1x2:
+        return "  • 1X2: Casa {casa} | Empate {empate} | Fora {fora}".format_map(defaultdict(lambda: "N/A", consulta.odds_1x2))
+    return None
+
+def _formatar_over_under(consulta: ConsultaAposta) -> Optional[str]:
+    if consulta.odds_over_under:
+        return "  • Over/Under 2.5: Over {over} | Under {under}".format_map(defaultdict(lambda: "N/A", consulta.odds_over_under))
+    return None
+
+def _formatar_btts(consulta: ConsultaAposta) -> Optional[str]:
+    if consulta.odds_btts:
+        return "  • BTTS: Sim {sim} | Não {nao}".format_map(defaultdict(lambda: "N/A", consulta.odds_btts))
+    return None
+
+# Formatador de cada mercado, resolvido uma única vez na importação
+_MARKET_DISPATCH: Dict[TipoMercado, Callable[[ConsultaAposta], Optional[str]]] = {
+    TipoMercado.RESULTADO_1X2: _formatar_1x2,
+    TipoMercado.OVER_UNDER: _formatar_over_under,
+    TipoMercado.BTTS: _formatar_btts,
+}
+
+def _gevent_ativo() -> bool:
+    """True quando o gevent já aplicou o monkey-patch (workers gevent do gunicorn)"""
+    monkey = sys.modules.get("gevent.monkey")
+    return monkey is not None and monkey.is_module_patched("socket")
+
+# Checagens baratas da entrada, feitas antes de montar qualquer objeto da consulta
+_CAMPOS_OBRIGATORIOS = ("liga", "time_casa", "time_fora")
+_CAMPOS_TEXTO = _CAMPOS_OBRIGATORIOS + ("contexto_adicional",)
+_CAMPOS_ODDS = ("odd_casa", "odd_empate", "odd_fora", "odd_over", "odd_under", "odd_btts_sim", "odd_btts_nao")
+ODD_MINIMA = 1.01
+
+def _pre_validar_dados(dados: Any) -> None:
+    """
+    Rejeita formato errado, campos obrigatórios ausentes, campos de texto que não são string
+    (a consulta vira chave de cache: valores não hasheáveis não podem chegar lá)
+    e odds não numéricas, não finitas ou abaixo de ODD_MINIMA.
+    """
+    if not isinstance(dados, dict):
+        raise ValueError("A consulta deve ser um objeto JSON")
+    faltando = [campo for campo in _CAMPOS_OBRIGATORIOS if not dados.get(campo)]
+    if faltando:
+        raise ValueError(f"Campos obrigatórios ausentes: {', '.join(faltando)}")
+    for campo in _CAMPOS_TEXTO:
+        valor = dados.get(campo)
+        if valor is not None and not isinstance(valor, str):
+            raise ValueError(f"O campo '{campo}' deve ser um texto")
+    for campo in _CAMPOS_ODDS:
+        valor = dados.get(campo)
+        if not valor:
+            continue
+        if isinstance(valor, bool) or not isinstance(valor, (int, float, str)):
+            raise ValueError(f"Odd inválida em '{campo}'")
+        try:
+            odd = float(valor)
+        except ValueError:
+            raise ValueError(f"Odd inválida em '{campo}'") from None
+        if not math.isfinite(odd):
+            raise ValueError(f"Odd inválida em '{campo}'")
+        if odd < ODD_MINIMA:
+            raise ValueError(f"A odd em '{campo}' deve ser no mínimo {ODD_MINIMA}")
+
+# Campos da Justificativa Final usados para decidir o reprocessamento com o Pro
+_RE_NIVEL_CONFIANCA = re.compile(r"N[íi]vel de Confian[çc]a[:*\s]*(Alto|M[ée]dio|Baixo)", re.IGNORECASE)
+_RE_EV_CALCULADO = re.compile(r"EV calculado[:*\s]*([-+−]?\d+(?:[.,]\d+)?)\s*(%?)", re.IGNORECASE)
+
 class AnalistaQuantitativoXG:
     """
     Alpha Quant Analyst - Especialista em Expected Goals (XG)
     Foco: Value Bets com +EV baseado em análise XG/XA/XPts
     """
     
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, cache_compartilhado: Optional[Cache] = None):
         """
         Inicialização MODIFICADA para Google Gemini API
         """
         self.api_key = api_key
         
-        # 1. Configurar a API key do Google
+        # 1. Configurar a API key do Google (import adiado: grpc/protobuf pesam na importação)
+        import google.generativeai as genai
+        self._genai = genai
         try:
+            # Sem 'transport': o padrão do SDK já usa gRPC (canal HTTP/2 persistente) nas chamadas
+            # síncronas e grpc_asyncio nas assíncronas; fixar "grpc" quebraria generate_content_async
             genai.configure(api_key=api_key)
         except Exception as e:
             print(f"Erro ao configurar a API do Gemini: {e}")
@@ -86,29 +305,125 @@ class AnalistaQuantitativoXG:
             {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
         ]
 
-        # 5. Inicializar o Modelo Generativo (Cliente)
-        self.client = genai.GenerativeModel(
-            model_name="gemini-pro", # Ou "gemini-pro" se preferir
-            system_instruction=system_instruction,
+        # 5. Base de conhecimento e prefixo estático do prompt (montados uma única vez)
+        self.logger = logging.getLogger(__name__)
+        self.system_instruction = system_instruction
+        self.base_conhecimento = self._carregar_base_conhecimento()
+        self.prefixo_estatico = self._gerar_prefixo_estatico()
+
+        # 6. Inicializar os Modelos Generativos (Clientes) sobre o Context Cache
+        self.caches = {}
+        self._caches_expiram_em = {}
+        self._caches_lock = threading.Lock()
+        self.client_fast = self._criar_cliente(MODELO_GEMINI_RAPIDO)
+        self.client_pro = self._criar_cliente(MODELO_GEMINI_PRO)
+
+        # 7. Cache de respostas (evita nova chamada ao Gemini para consultas idênticas):
+        #    L1 em memória no processo + L2 opcional compartilhado entre workers (Flask-Caching)
+        self._resp_cache = TTLCache(maxsize=RESP_CACHE_MAXSIZE, ttl=RESP_CACHE_TTL_SEGUNDOS)
+        self._resp_cache_lock = threading.Lock()
+        self.cache_compartilhado = cache_compartilhado
+
+        # 8. Loop asyncio dedicado para os lotes (o cliente async do Gemini fica preso ao loop em que foi criado)
+        self._loop = None
+        self._loop_lock = threading.Lock()
+        # Semáforo único do analista (criado já dentro do loop): limita as chamadas de todos os lotes juntos
+        self._semaforo_lote = None
+        # Sob gevent o lote usa um Pool de greenlets (criado sob demanda)
+        self._pool_gevent = None
+
+        # 9. Sessão HTTP keep-alive (com a chave já nos headers) para as chamadas REST do Batch Mode
+        self._sessao_rest = requests.Session()
+        self._sessao_rest.headers["x-goog-api-key"] = api_key
+
+    def _criar_cliente(self, modelo: str):
+        """
+        Cria o cliente Gemini com o prefixo estático em um CachedContent (um por modelo).
+        Se o prefixo estiver abaixo de CACHE_MIN_TOKENS (estimativa local, ~4 caracteres
+        por token) ou o cache não puder ser criado, o prefixo segue junto da instrução de sistema.
+        """
+        tokens_estimados = (len(self.system_instruction) + len(self.prefixo_estatico)) // 4
+        if tokens_estimados < CACHE_MIN_TOKENS:
+            self.logger.info("Prefixo com ~%s tokens (mínimo %s): Context Cache não usado para %s",
+                             tokens_estimados, CACHE_MIN_TOKENS, modelo)
+            return self._cliente_sem_cache(modelo)
+
+        try:
+            cache = self._genai.caching.CachedContent.create(
+                model=modelo,
+                system_instruction=self.system_instruction,
+                contents=[self.prefixo_estatico],
+                ttl=CACHE_TTL
+            )
+            self.caches[modelo] = cache
+            self._caches_expiram_em[modelo] = datetime.now() + CACHE_TTL
+            return self._genai.GenerativeModel.from_cached_content(
+                cache,
+                generation_config=self.generation_config,
+                safety_settings=self.safety_settings
+            )
+        except Exception as e:
+            self.logger.warning("Context Cache indisponível para %s, usando prompt completo: %s", modelo, e)
+            return self._cliente_sem_cache(modelo)
+
+    def _cliente_sem_cache(self, modelo: str):
+        return self._genai.GenerativeModel(
+            model_name=modelo,
+            system_instruction=f"{self.system_instruction}\n\n{self.prefixo_estatico}",
             generation_config=self.generation_config,
             safety_settings=self.safety_settings
         )
-        
-        self.base_conhecimento = self._carregar_base_conhecimento()
-        self._configurar_logging()
 
-    def _configurar_logging(self):
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s'
-        )
-        self.logger = logging.getLogger(__name__)
+    def aquecer_clientes(self):
+        """
+        Faz uma chamada mínima (1 token) em cada cliente para abrir o canal gRPC
+        e carregar os metadados do modelo antes da primeira consulta real.
+        Também abre a conexão TLS da sessão REST (e valida a chave) com um GET barato.
+        """
+        for client in (self.client_fast, self.client_pro):
+            try:
+                client.generate_content("ping", generation_config={"max_output_tokens": 1})
+                self.logger.info("Cliente %s aquecido", client.model_name)
+            except Exception as e:
+                self.logger.warning("Falha ao aquecer o cliente %s: %s", client.model_name, e)
+
+        try:
+            self._sessao_rest.get(f"{GEMINI_API_URL}/v1beta/{MODELO_GEMINI_PRO}", timeout=10).raise_for_status()
+            self.logger.info("Sessão REST aquecida")
+        except Exception as e:
+            self.logger.warning("Falha ao aquecer a sessão REST: %s", e)
+
+    def _renovar_cache(self):
+        """
+        Estende o TTL dos CachedContent perto de expirarem. Se o cache já sumiu do servidor
+        (ex: uma hora sem requisições, update() falha com NotFound/PermissionDenied),
+        recria o cache e o cliente do modelo.
+        """
+        if not self.caches:
+            return
+        with self._caches_lock:
+            for modelo, cache in list(self.caches.items()):
+                if datetime.now() < self._caches_expiram_em[modelo] - timedelta(minutes=5):
+                    continue
+                try:
+                    cache.update(ttl=CACHE_TTL)
+                    self._caches_expiram_em[modelo] = datetime.now() + CACHE_TTL
+                except Exception as e:
+                    self.logger.warning("Context Cache de %s expirado ou indisponível, recriando: %s", modelo, e)
+                    del self.caches[modelo]
+                    del self._caches_expiram_em[modelo]
+                    client = self._criar_cliente(modelo)
+                    if modelo == MODELO_GEMINI_RAPIDO:
+                        self.client_fast = client
+                    else:
+                        self.client_pro = client
 
     def _carregar_base_conhecimento(self) -> Dict[str, Any]:
         """
-        Base de conhecimento simulando RAG (sem alterações)
+        Base de conhecimento simulando RAG.
+        As seções usadas no prompt já ficam serializadas em JSON (uma única vez).
         """
-        return {
+        base = {
             "fontes_dados_prioridade": {
                 "P1_XG_Foundation": [
                     "UnderStat (https://understat.com)",
@@ -150,14 +465,22 @@ class AnalistaQuantitativoXG:
             }
         }
 
-    def _gerar_prompt_especializado(self, consulta: ConsultaAposta) -> str:
+        fontes = base["fontes_dados_prioridade"]
+        self._p1_json = json.dumps(fontes["P1_XG_Foundation"], separators=(",", ":"), ensure_ascii=False)
+        self._p2_json = json.dumps(fontes["P2_Market_Value"], separators=(",", ":"), ensure_ascii=False)
+        self._p3_json = json.dumps(fontes["P3_Context_History"], separators=(",", ":"), ensure_ascii=False)
+        self._p4_json = json.dumps(fontes["P4_Live_Context"], separators=(",", ":"), ensure_ascii=False)
+        self._thresholds_json = json.dumps(base["thresholds_decisao"], separators=(",", ":"), ensure_ascii=False)
+
+        return base
+
+    def _gerar_prefixo_estatico(self) -> str:
         """
-        Gera o Prompt Mestre.
+        Gera a parte fixa do Prompt Mestre (metodologia, RAG, protocolo CoT e thresholds).
+        Idêntica para todas as consultas, por isso vai para o Context Cache.
         """
         
-        odds_formatadas = self._formatar_odds(consulta)
-        
-        prompt = f"""#METHODOLOGY_CONSTRAINT
+        prefixo = f"""#METHODOLOGY_CONSTRAINT
 - Modelo Preditivo: A probabilidade real ($P_c$) de resultados (1X2, O/U 2.5, BTTS) deve ser calculada usando os dados XG/XA de 10 jogos como inputs primários para um Modelo de Poisson Bivariado ou similar. Gols Reais (G) são usados apenas para avaliar a variância de finalização, não como preditor primário.
 - Cálculo de Valor: O Valor Esperado ($EV$) é MANDATÓRIO e deve ser calculado pela fórmula $EV = (P_c \\times Odds) - 1$.
 
@@ -165,29 +488,22 @@ class AnalistaQuantitativoXG:
 Sua base de dados para análise é a simulação RAG das seguintes URLs. Você deve priorizar a coleta e a coerência dos dados conforme a hierarquia (P1, P2, P3, P4):
 
 P1 (XG Foundation - Prioridade Máxima):
-{json.dumps(self.base_conhecimento["fontes_dados_prioridade"]["P1_XG_Foundation"], indent=2, ensure_ascii=False)}
+{self._p1_json}
 
 P2 (Market Value & Movement):
-{json.dumps(self.base_conhecimento["fontes_dados_prioridade"]["P2_Market_Value"], indent=2, ensure_ascii=False)}
+{self._p2_json}
 
 P3 (Context & History):
-{json.dumps(self.base_conhecimento["fontes_dados_prioridade"]["P3_Context_History"], indent=2, ensure_ascii=False)}
+{self._p3_json}
 
 P4 (Live Context & Human Factor):
-{json.dumps(self.base_conhecimento["fontes_dados_prioridade"]["P4_Live_Context"], indent=2, ensure_ascii=False)}
-
-#DATA_INPUT_TEMPLATE
-- Liga/Campeonato: {consulta.liga}
-- Partida: {consulta.time_casa} vs {consulta.time_fora}
-- Odds de Mercado:
-{odds_formatadas}
-{f"- Contexto Adicional: {consulta.contexto_adicional}" if consulta.contexto_adicional else ""}
+{self._p4_json}
 
 #CHAIN_OF_THOUGHT_PROTOCOL
 Você deve executar a análise em 5 passos CoT sequenciais. A resposta deve apresentar os resultados de cada passo de forma transparente e estruturada.
 
 <COT_STEP_1: Coleta e Power Rating XG>
-Recupere e normalize o XG, XGD, XA e XPts dos últimos 10 jogos para {consulta.time_casa} e {consulta.time_fora} (fontes P1). Calcule o Power Rating bruto, ajustando o XG pela média da liga e fator casa/fora.
+Recupere e normalize o XG, XGD, XA e XPts dos últimos 10 jogos para o time da casa e o time visitante informados em #DATA_INPUT_TEMPLATE (fontes P1). Calcule o Power Rating bruto, ajustando o XG pela média da liga e fator casa/fora.
 
 IMPORTANTE: Como você está simulando o acesso às URLs, forneça estimativas razoáveis baseadas no contexto da liga e dos times, deixando claro que são simulações. Cite as fontes que você "consultaria" (P1).
 
@@ -234,117 +550,546 @@ O último parágrafo da sua resposta DEVE ser o aviso de risco obrigatório:
 ⚠️ AVISO DE RISCO: A análise de IA não garante lucro. Apostas esportivas envolvem risco significativo de perda financeira. Jogue com responsabilidade e use apenas fundos que você pode perder. Procure ajuda se o jogo se tornar problemático.
 
 THRESHOLDS DE DECISÃO:
-{json.dumps(self.base_conhecimento["thresholds_decisao"], indent=2, ensure_ascii=False)}
-
-AGORA, INICIE A ANÁLISE SEGUINDO RIGOROSAMENTE OS 5 PASSOS CoT:
+{self._thresholds_json}
 """
         
-        return prompt
+        return prefixo
+
+    def _gerar_prompt_especializado(self, consulta: ConsultaAposta) -> str:
+        """
+        Gera a parte variável do Prompt Mestre (dados da partida).
+        """
+        
+        linha_contexto = f"- Contexto Adicional: {consulta.contexto_adicional}" if consulta.contexto_adicional else ""
+
+        probabilidades = None
+        if consulta.xg_casa is not None and consulta.xg_fora is not None:
+            probabilidades = {
+                mercado: f"{p:.1%}"
+                for mercado, p in _probabilidades_poisson(consulta.xg_casa, consulta.xg_fora).items()
+            }
+
+        return _PROMPT_DADOS_PARTIDA.render(
+            liga=consulta.liga,
+            time_casa=consulta.time_casa,
+            time_fora=consulta.time_fora,
+            odds_formatadas=self._formatar_odds(consulta),
+            linha_contexto=linha_contexto,
+            xg_casa=consulta.xg_casa,
+            xg_fora=consulta.xg_fora,
+            probabilidades=probabilidades
+        )
+
+    def _config_geracao(self, consulta: ConsultaAposta) -> Dict[str, Any]:
+        """
+        Limita max_output_tokens ao número de mercados com odds informadas.
+        Sem odds, a análise cobre todos os mercados e usa o limite padrão.
+        """
+        n_mercados = sum(odds is not None for odds in (consulta.odds_1x2, consulta.odds_over_under, consulta.odds_btts))
+        if n_mercados == 0:
+            return self.generation_config
+        limite = min(TOKENS_SAIDA_BASE + TOKENS_SAIDA_POR_MERCADO * n_mercados, self.generation_config["max_output_tokens"])
+        return {**self.generation_config, "max_output_tokens": limite}
 
     def _formatar_odds(self, consulta: ConsultaAposta) -> str:
         """Formata as odds para inclusão no prompt"""
-        odds_texto = []
-        
-        if consulta.odds_1x2:
-            odds_texto.append(f"  • 1X2: Casa {consulta.odds_1x2.get('casa', 'N/A')} | Empate {consulta.odds_1x2.get('empate', 'N/A')} | Fora {consulta.odds_1x2.get('fora', 'N/A')}")
-        
-        if consulta.odds_over_under:
-            odds_texto.append(f"  • Over/Under 2.5: Over {consulta.odds_over_under.get('over', 'N/A')} | Under {consulta.odds_over_under.get('under', 'N/A')}")
-        
-        if consulta.odds_btts:
-            odds_texto.append(f"  • BTTS: Sim {consulta.odds_btts.get('sim', 'N/A')} | Não {consulta.odds_btts.get('nao', 'N/A')}")
+        odds_texto = [linha for formatar in _MARKET_DISPATCH.values() if (linha := formatar(consulta))]
         
         return "\n".join(odds_texto) if odds_texto else "  • Odds não fornecidas"
 
+    @staticmethod
+    def _chave_cache(consulta: ConsultaAposta) -> tuple:
+        """Chave canônica (serializável) da consulta para o cache compartilhado (ignora o timestamp)"""
+        return (
+            consulta.liga,
+            consulta.time_casa,
+            consulta.time_fora,
+            tuple(sorted((consulta.odds_1x2 or {}).items())),
+            tuple(sorted((consulta.odds_over_under or {}).items())),
+            tuple(sorted((consulta.odds_btts or {}).items())),
+            consulta.contexto_adicional,
+            consulta.xg_casa,
+            consulta.xg_fora
+        )
+
+    def _chave_compartilhada(self, consulta: ConsultaAposta) -> str:
+        return "analise:" + hashlib.sha256(orjson.dumps(self._chave_cache(consulta))).hexdigest()
+
+    def _buscar_cache(self, consulta: ConsultaAposta) -> Optional[Tuple[str, str]]:
+        """
+        Retorna (analise_completa, modelo) se a consulta já foi analisada (L1, depois L2).
+        No L1 a própria ConsultaAposta é a chave (imutável, hash/igualdade sem o timestamp).
+        """
+        with self._resp_cache_lock:
+            em_cache = self._resp_cache.get(consulta)
+        if em_cache is not None or self.cache_compartilhado is None:
+            return em_cache
+
+        try:
+            em_cache = self.cache_compartilhado.get(self._chave_compartilhada(consulta))
+        except Exception as e:
+            self.logger.warning("Falha ao consultar o cache compartilhado: %s", e)
+            return None
+        if em_cache is not None:
+            em_cache = tuple(em_cache)
+            with self._resp_cache_lock:
+                self._resp_cache[consulta] = em_cache
+        return em_cache
+
+    def _guardar_cache(self, consulta: ConsultaAposta, analise_completa: str, modelo: str):
+        with self._resp_cache_lock:
+            self._resp_cache[consulta] = (analise_completa, modelo)
+        if self.cache_compartilhado is None:
+            return
+
+        try:
+            self.cache_compartilhado.set(
+                self._chave_compartilhada(consulta),
+                (analise_completa, modelo),
+                timeout=CACHE_COMPARTILHADO_TTL_SEGUNDOS
+            )
+        except Exception as e:
+            self.logger.warning("Falha ao gravar no cache compartilhado: %s", e)
+
+    @staticmethod
+    def _precisa_modelo_pro(analise_completa: str) -> bool:
+        """True se a análise reporta Nível de Confiança Baixo ou EV abaixo de EV_LIMITE_ESCALONAMENTO"""
+        confianca = _RE_NIVEL_CONFIANCA.search(analise_completa)
+        if confianca and confianca.group(1).lower() == "baixo":
+            return True
+        ev = _RE_EV_CALCULADO.search(analise_completa)
+        if ev:
+            valor = float(ev.group(1).replace(",", ".").replace("−", "-"))
+            if ev.group(2):
+                valor /= 100
+            return valor < EV_LIMITE_ESCALONAMENTO
+        return False
+
+    def _extrair_analise(self, response) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """Extrai o texto da resposta do Gemini. Retorna (analise, None) ou (None, erro)"""
+        try:
+            return response.text, None
+        except ValueError as e:
+            self.logger.error("Resposta bloqueada pelo Gemini: %s", e)
+            self.logger.error("Detalhes do bloqueio: %s", response.prompt_feedback)
+            return None, {
+                "erro": True,
+                "mensagem": "A resposta foi bloqueada pela política de segurança do Gemini.",
+                "detalhes": f"Feedback do Prompt: {response.prompt_feedback}"
+            }
+        except Exception as e:
+            self.logger.error("Erro ao extrair texto da resposta: %s", e)
+            return None, {
+                "erro": True,
+                "mensagem": "Erro ao extrair texto da resposta do Gemini.",
+                "detalhes": str(e)
+            }
+
+    def _montar_resultado(self, consulta: ConsultaAposta, analise_completa: str, modelo: str) -> Dict[str, Any]:
+        """Monta o resultado final (com timestamp da consulta) em torno da análise"""
+        return {"analise_completa": analise_completa, **self.metadados_resultado(consulta, modelo)}
+
+    def metadados_resultado(self, consulta: ConsultaAposta, modelo: str) -> Dict[str, Any]:
+        """Campos do resultado que não dependem do texto da análise"""
+        return {
+            "partida": f"{consulta.time_casa} vs {consulta.time_fora}",
+            "liga": consulta.liga,
+            "odds_fornecidas": {
+                "1x2": consulta.odds_1x2,
+                "over_under": consulta.odds_over_under,
+                "btts": consulta.odds_btts
+            },
+            "timestamp": consulta.timestamp,
+            "modelo_usado": f"{modelo} (Google AI)",
+            "metodologia": "Chain-of-Thought (5 passos) + Modelo Poisson + Kelly Criterion",
+            "disclaimer": "⚠️ Análise de IA não garante lucro. Apostas envolvem risco de perda financeira."
+        }
+
     def processar_consulta(self, consulta: ConsultaAposta) -> Dict[str, Any]:
         """
         Processa a consulta de aposta
         """
         try:
-            self.logger.info(f"Processando análise: {consulta.time_casa} vs {consulta.time_fora}")
+            self.logger.info("Processando análise: %s vs %s", consulta.time_casa, consulta.time_fora)
+
+            em_cache = self._buscar_cache(consulta)
+
+            if em_cache is not None:
+                self.logger.info("Análise servida do cache de respostas")
+                return self._montar_resultado(consulta, *em_cache)
 
             prompt = self._gerar_prompt_especializado(consulta)
+            config = self._config_geracao(consulta)
 
-            response = self.client.generate_content(prompt)
+            self._renovar_cache()
+            response = self.client_fast.generate_content(prompt, generation_config=config)
 
-            try:
-                analise_completa = response.text
-            except ValueError as e:
-                self.logger.error(f"Resposta bloqueada pelo Gemini: {e}")
-                self.logger.error(f"Detalhes do bloqueio: {response.prompt_feedback}")
-                return {
-                    "erro": True,
-                    "mensagem": "A resposta foi bloqueada pela política de segurança do Gemini.",
-                    "detalhes": f"Feedback do Prompt: {response.prompt_feedback}"
-                }
-            except Exception as e:
-                self.logger.error(f"Erro ao extrair texto da resposta: {e}")
-                return {
-                    "erro": True,
-                    "mensagem": "Erro ao extrair texto da resposta do Gemini.",
-                    "detalhes": str(e)
-                }
+            analise_completa, erro = self._extrair_analise(response)
+            if erro:
+                return erro
+            modelo = self.client_fast.model_name
 
-            resultado = {
-                "analise_completa": analise_completa,
-                "partida": f"{consulta.time_casa} vs {consulta.time_fora}",
-                "liga": consulta.liga,
-                "odds_fornecidas": {
-                    "1x2": consulta.odds_1x2,
-                    "over_under": consulta.odds_over_under,
-                    "btts": consulta.odds_btts
-                },
-                "timestamp": consulta.timestamp.isoformat(),
-                "modelo_usado": f"{self.client.model_name} (Google AI)",
-                "metodologia": "Chain-of-Thought (5 passos) + Modelo Poisson + Kelly Criterion",
-                "disclaimer": "⚠️ Análise de IA não garante lucro. Apostas envolvem risco de perda financeira."
-            }
+            if self._precisa_modelo_pro(analise_completa):
+                self.logger.info("Confiança baixa ou EV marginal no Flash, reprocessando com %s", self.client_pro.model_name)
+                try:
+                    response = self.client_pro.generate_content(prompt, generation_config=config)
+                    analise_pro, erro = self._extrair_analise(response)
+                    if erro is None:
+                        analise_completa, modelo = analise_pro, self.client_pro.model_name
+                except Exception as e:
+                    self.logger.error("Erro no modelo Pro, mantendo análise do Flash: %s", e)
+
+            self._guardar_cache(consulta, analise_completa, modelo)
+
+            resultado = self._montar_resultado(consulta, analise_completa, modelo)
 
             self.logger.info("Análise processada com sucesso")
             return resultado
 
         except Exception as e:
-            self.logger.error(f"Erro ao processar análise: {str(e)}")
+            self.logger.error("Erro ao processar análise: %s", e)
             return {
                 "erro": True,
                 "mensagem": "Erro interno ao processar análise quantitativa",
                 "detalhes": str(e)
             }
 
+    def stream_consulta(self, consulta: ConsultaAposta) -> Tuple[str, Iterator[str]]:
+        """
+        Inicia a análise em stream (stream=True). Retorna (modelo, pedaços do texto).
+        Usa sempre o Flash: o texto já enviado não pode ser reprocessado com o Pro.
+        Erros (ex: resposta bloqueada) são propagados para quem consome o gerador.
+        """
+        self.logger.info("Processando análise (stream): %s vs %s", consulta.time_casa, consulta.time_fora)
+
+        em_cache = self._buscar_cache(consulta)
+        if em_cache is not None:
+            self.logger.info("Análise servida do cache de respostas")
+            analise_completa, modelo = em_cache
+            return modelo, iter((analise_completa,))
+
+        self._renovar_cache()
+        response = self.client_fast.generate_content(
+            self._gerar_prompt_especializado(consulta),
+            generation_config=self._config_geracao(consulta),
+            stream=True
+        )
+        return self.client_fast.model_name, self._consumir_stream(consulta, response)
+
+    def _consumir_stream(self, consulta: ConsultaAposta, response) -> Iterator[str]:
+        partes = []
+        for chunk in response:
+            partes.append(chunk.text)
+            yield chunk.text
+
+        # Análise do Flash que pediria o Pro não vai para o cache: senão processar_consulta
+        # a devolveria aos clientes JSON sem nunca reprocessar com o Pro
+        analise_completa = "".join(partes)
+        if not self._precisa_modelo_pro(analise_completa):
+            self._guardar_cache(consulta, analise_completa, self.client_fast.model_name)
+        self.logger.info("Análise (stream) processada com sucesso")
+
+    def _separar_pendentes(self, consultas: List[ConsultaAposta]) -> Tuple[Dict[ConsultaAposta, Tuple[str, str]], List[ConsultaAposta]]:
+        """Análises já em cache e consultas que precisam do Gemini (sem repetidas)"""
+        # Consultas iguais (mesma partida/odds/contexto) compartilham a mesma chave no dict
+        analises: Dict[ConsultaAposta, Tuple[str, str]] = {}
+        pendentes: List[ConsultaAposta] = []
+        for consulta in dict.fromkeys(consultas):
+            em_cache = self._buscar_cache(consulta)
+            if em_cache is not None:
+                analises[consulta] = em_cache
+            else:
+                pendentes.append(consulta)
+
+        self.logger.info("Processando lote: %s consultas, %s chamadas ao Gemini", len(consultas), len(pendentes))
+        return analises, pendentes
+
+    def _registrar_respostas_flash(self, pendentes: List[ConsultaAposta], respostas: List[Any],
+                                   analises: Dict[ConsultaAposta, Tuple[str, str]]) -> Dict[ConsultaAposta, Dict[str, Any]]:
+        """Guarda as análises do Flash em 'analises' e retorna os erros por consulta"""
+        erros: Dict[ConsultaAposta, Dict[str, Any]] = {}
+        for consulta, response in zip(pendentes, respostas):
+            if isinstance(response, Exception):
+                self.logger.error("Erro ao processar análise do lote: %s", response)
+                erros[consulta] = {
+                    "erro": True,
+                    "mensagem": "Erro interno ao processar análise quantitativa",
+                    "detalhes": str(response)
+                }
+                continue
+            analise_completa, erro = self._extrair_analise(response)
+            if erro:
+                erros[consulta] = erro
+                continue
+            analises[consulta] = (analise_completa, self.client_fast.model_name)
+        return erros
+
+    def _a_escalonar(self, pendentes: List[ConsultaAposta], analises: Dict[ConsultaAposta, Tuple[str, str]]) -> List[ConsultaAposta]:
+        """Consultas cuja análise do Flash tem confiança baixa ou EV marginal"""
+        escalonar = [c for c in pendentes if c in analises and self._precisa_modelo_pro(analises[c][0])]
+        if escalonar:
+            self.logger.info("Reprocessando %s consultas do lote com %s", len(escalonar), self.client_pro.model_name)
+        return escalonar
+
+    def _registrar_respostas_pro(self, escalonar: List[ConsultaAposta], respostas: List[Any],
+                                 analises: Dict[ConsultaAposta, Tuple[str, str]]):
+        for consulta, response in zip(escalonar, respostas):
+            if isinstance(response, Exception):
+                self.logger.error("Erro no modelo Pro, mantendo análise do Flash: %s", response)
+                continue
+            analise_pro, erro = self._extrair_analise(response)
+            if erro is None:
+                analises[consulta] = (analise_pro, self.client_pro.model_name)
+
+    def _finalizar_lote(self, consultas: List[ConsultaAposta], pendentes: List[ConsultaAposta],
+                        analises: Dict[ConsultaAposta, Tuple[str, str]],
+                        erros: Dict[ConsultaAposta, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        for consulta in pendentes:
+            if consulta in analises:
+                self._guardar_cache(consulta, *analises[consulta])
+
+        return [
+            erros[consulta] if consulta in erros else self._montar_resultado(consulta, *analises[consulta])
+            for consulta in consultas
+        ]
+
+    async def processar_consultas_batch(self, consultas: List[ConsultaAposta]) -> List[Dict[str, Any]]:
+        """
+        Processa várias consultas em paralelo (generate_content_async + asyncio.gather).
+        Consultas já em cache ou repetidas no lote não geram nova chamada ao Gemini.
+        """
+        if self._semaforo_lote is None:
+            self._semaforo_lote = asyncio.Semaphore(BATCH_CONCORRENCIA_MAXIMA)
+        analises, pendentes = self._separar_pendentes(consultas)
+
+        async def _gerar(client, consulta: ConsultaAposta):
+            async with self._semaforo_lote:
+                return await client.generate_content_async(
+                    self._gerar_prompt_especializado(consulta),
+                    generation_config=self._config_geracao(consulta)
+                )
+
+        self._renovar_cache()
+        respostas = await asyncio.gather(
+            *(_gerar(self.client_fast, c) for c in pendentes),
+            return_exceptions=True
+        )
+        erros = self._registrar_respostas_flash(pendentes, respostas, analises)
+
+        # Reprocessa com o Pro as análises do Flash com confiança baixa ou EV marginal
+        escalonar = self._a_escalonar(pendentes, analises)
+        if escalonar:
+            respostas = await asyncio.gather(
+                *(_gerar(self.client_pro, c) for c in escalonar),
+                return_exceptions=True
+            )
+            self._registrar_respostas_pro(escalonar, respostas, analises)
+
+        return self._finalizar_lote(consultas, pendentes, analises, erros)
+
+    def _processar_lote_gevent(self, consultas: List[ConsultaAposta]) -> List[Dict[str, Any]]:
+        """
+        Mesmo fluxo de processar_consultas_batch para workers gevent: generate_content síncrono
+        em greenlets de um Pool (grpc.aio numa thread com loop próprio trava o hub do gevent).
+        """
+        if self._pool_gevent is None:
+            from gevent.pool import Pool
+
+            self._pool_gevent = Pool(BATCH_CONCORRENCIA_MAXIMA)
+        analises, pendentes = self._separar_pendentes(consultas)
+
+        def _gerar_todos(client, lote: List[ConsultaAposta]) -> List[Any]:
+            def _gerar(consulta: ConsultaAposta):
+                try:
+                    return client.generate_content(
+                        self._gerar_prompt_especializado(consulta),
+                        generation_config=self._config_geracao(consulta)
+                    )
+                except Exception as e:
+                    return e
+            return self._pool_gevent.map(_gerar, lote)
+
+        self._renovar_cache()
+        respostas = _gerar_todos(self.client_fast, pendentes)
+        erros = self._registrar_respostas_flash(pendentes, respostas, analises)
+
+        escalonar = self._a_escalonar(pendentes, analises)
+        if escalonar:
+            self._registrar_respostas_pro(escalonar, _gerar_todos(self.client_pro, escalonar), analises)
+
+        return self._finalizar_lote(consultas, pendentes, analises, erros)
+
+    def processar_lote(self, consultas: List[ConsultaAposta]) -> List[Dict[str, Any]]:
+        """
+        Processa o lote em paralelo: greenlets sob gevent (gunicorn); fora dele,
+        processar_consultas_batch no loop asyncio dedicado do analista.
+        """
+        if _gevent_ativo():
+            return self._processar_lote_gevent(consultas)
+
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="analista-batch", daemon=True).start()
+        futuro = asyncio.run_coroutine_threadsafe(self.processar_consultas_batch(consultas), self._loop)
+        try:
+            return futuro.result(timeout=BATCH_TIMEOUT_SEGUNDOS)
+        except concurrent.futures.TimeoutError:
+            # Cancela as chamadas ainda pendentes no loop para liberarem o semáforo
+            futuro.cancel()
+            raise TimeoutError(f"Lote não concluído em {BATCH_TIMEOUT_SEGUNDOS}s")
+
+    def _requisicao_lote(self, indice: int, consulta: ConsultaAposta, cache_lote=None) -> Dict[str, Any]:
+        """Monta uma linha do JSONL do Batch Mode (mesmos parâmetros do cliente interativo)"""
+        requisicao = {
+            "contents": [{"role": "user", "parts": [{"text": self._gerar_prompt_especializado(consulta)}]}],
+            "generation_config": self._config_geracao(consulta),
+            "safety_settings": self.safety_settings
+        }
+        if cache_lote is not None:
+            requisicao["cached_content"] = cache_lote.name
+        else:
+            requisicao["system_instruction"] = {"parts": [{"text": f"{self.system_instruction}\n\n{self.prefixo_estatico}"}]}
+        return {"key": f"consulta-{indice}", "request": requisicao}
+
+    def processar_lote_diferido(self, consultas: List[ConsultaAposta]) -> List[Dict[str, Any]]:
+        """
+        Processa um lote via Batch Mode do Gemini (JSONL + job assíncrono no servidor).
+        Sem requisito de latência, o lote vai direto para o modelo Pro.
+        Bloqueia até o job terminar: use para análises agendadas, não em rotas HTTP.
+        """
+        self.logger.info("Enviando lote diferido com %s consultas", len(consultas))
+
+        cache_lote = self._criar_cache_lote()
+        try:
+            return self._executar_lote_diferido(consultas, cache_lote)
+        finally:
+            if cache_lote is not None:
+                try:
+                    cache_lote.delete()
+                except Exception as e:
+                    self.logger.warning("Falha ao remover o Context Cache do lote: %s", e)
+
+    def _criar_cache_lote(self):
+        """
+        CachedContent próprio do lote diferido, com TTL até o fim do job (LOTE_DIFERIDO_TIMEOUT):
+        o cache do cliente interativo (1h) pode expirar ou ser recriado com outro nome no meio do job.
+        Só é criado quando o Context Cache está em uso no Pro (prefixo acima do mínimo de tokens).
+        """
+        if MODELO_GEMINI_PRO not in self.caches:
+            return None
+        try:
+            return self._genai.caching.CachedContent.create(
+                model=MODELO_GEMINI_PRO,
+                system_instruction=self.system_instruction,
+                contents=[self.prefixo_estatico],
+                ttl=timedelta(seconds=LOTE_DIFERIDO_TIMEOUT) + timedelta(hours=1)
+            )
+        except Exception as e:
+            self.logger.warning("Context Cache do lote indisponível, usando prompt completo: %s", e)
+            return None
+
+    def _executar_lote_diferido(self, consultas: List[ConsultaAposta], cache_lote) -> List[Dict[str, Any]]:
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl", encoding="utf-8", delete=False) as arquivo:
+            for indice, consulta in enumerate(consultas):
+                arquivo.write(orjson.dumps(self._requisicao_lote(indice, consulta, cache_lote)).decode("utf-8") + "\n")
+        try:
+            entrada = self._genai.upload_file(arquivo.name, mime_type="application/jsonl", display_name="analista-lote")
+        finally:
+            os.remove(arquivo.name)
+
+        resposta = self._sessao_rest.post(
+            f"{GEMINI_API_URL}/v1beta/{MODELO_GEMINI_PRO}:batchGenerateContent",
+            json={"batch": {"display_name": "analista-lote", "input_config": {"file_name": entrada.name}}},
+            timeout=60
+        )
+        resposta.raise_for_status()
+        nome_lote = resposta.json()["name"]
+
+        limite = time.monotonic() + LOTE_DIFERIDO_TIMEOUT
+        while True:
+            resposta = self._sessao_rest.get(f"{GEMINI_API_URL}/v1beta/{nome_lote}", timeout=60)
+            resposta.raise_for_status()
+            lote = resposta.json()
+            estado = lote.get("metadata", {}).get("state")
+            if estado == "BATCH_STATE_SUCCEEDED":
+                break
+            if estado in ("BATCH_STATE_FAILED", "BATCH_STATE_CANCELLED", "BATCH_STATE_EXPIRED"):
+                raise RuntimeError(f"Lote {nome_lote} terminou com estado {estado}")
+            if time.monotonic() > limite:
+                raise TimeoutError(f"Lote {nome_lote} não concluído em {LOTE_DIFERIDO_TIMEOUT}s")
+            time.sleep(LOTE_DIFERIDO_INTERVALO_POLL)
+
+        saida = lote.get("response", {}).get("responsesFile") or lote["metadata"]["output"]["responsesFile"]
+        resposta = self._sessao_rest.get(
+            f"{GEMINI_API_URL}/download/v1beta/{saida}:download",
+            params={"alt": "media"},
+            timeout=300
+        )
+        resposta.raise_for_status()
+
+        respostas_por_chave = {}
+        for linha in resposta.text.splitlines():
+            if linha.strip():
+                item = orjson.loads(linha)
+                respostas_por_chave[item.get("key")] = item
+
+        resultados = []
+        for indice, consulta in enumerate(consultas):
+            item = respostas_por_chave.get(f"consulta-{indice}", {})
+            try:
+                partes = item["response"]["candidates"][0]["content"]["parts"]
+                analise_completa = "".join(parte.get("text", "") for parte in partes)
+            except (KeyError, IndexError, TypeError):
+                detalhes = item.get("error") or item.get("response", {}).get("promptFeedback") or "Resposta ausente no lote"
+                resultados.append({
+                    "erro": True,
+                    "mensagem": "Erro ao extrair texto da resposta do Gemini.",
+                    "detalhes": str(detalhes)
+                })
+                continue
+            self._guardar_cache(consulta, analise_completa, MODELO_GEMINI_PRO)
+            resultados.append(self._montar_resultado(consulta, analise_completa, MODELO_GEMINI_PRO))
+
+        self.logger.info("Lote diferido %s concluído", nome_lote)
+        return resultados
+
+    @staticmethod
+    def _extrair_odds(dados: Dict, campos: Dict[str, str]) -> Optional[Dict[str, float]]:
+        """Converte os campos de odds presentes em {apelido: odd}; None se nenhum foi enviado"""
+        odds = {apelido: float(valor) for apelido, campo in campos.items() if (valor := dados.get(campo))}
+        return odds or None
+
+    @staticmethod
+    def _extrair_xg(dados: Dict, campo: str) -> Optional[float]:
+        """xG esperado de um time (opcional): número finito em (0, XG_MAXIMO]"""
+        valor = dados.get(campo)
+        # Só ausente/vazio é "não informado"; 0 cai na checagem de faixa
+        if valor is None or valor == "":
+            return None
+        if isinstance(valor, bool):
+            raise ValueError(f"xG inválido em '{campo}'")
+        try:
+            xg = float(valor)
+        except (TypeError, ValueError):
+            raise ValueError(f"xG inválido em '{campo}'") from None
+        if not math.isfinite(xg) or not 0 < xg <= XG_MAXIMO:
+            raise ValueError(f"O xG esperado em '{campo}' deve estar entre 0 e {XG_MAXIMO}")
+        return xg
+
     def validar_contexto_consulta(self, dados: Dict) -> ConsultaAposta:
         """Valida e cria objeto ConsultaAposta a partir dos dados recebidos"""
-        
-        if not dados.get("liga"):
-            raise ValueError("Liga/Campeonato é obrigatório")
-        if not dados.get("time_casa"):
-            raise ValueError("Time da casa é obrigatório")
-        if not dados.get("time_fora"):
-            raise ValueError("Time visitante é obrigatório")
-
-        # Processa odds 1X2
-        odds_1x2 = None
-        if dados.get("odd_casa") or dados.get("odd_empate") or dados.get("odd_fora"):
-            odds_1x2 = {
-                "casa": float(dados.get("odd_casa", 0)) if dados.get("odd_casa") else None,
-                "empate": float(dados.get("odd_empate", 0)) if dados.get("odd_empate") else None,
-                "fora": float(dados.get("odd_fora", 0)) if dados.get("odd_fora") else None
-            }
+        _pre_validar_dados(dados)
 
-        # Processa odds Over/Under
-        odds_over_under = None
-        if dados.get("odd_over") or dados.get("odd_under"):
-            odds_over_under = {
-                "over": float(dados.get("odd_over", 0)) if dados.get("odd_over") else None,
-                "under": float(dados.get("odd_under", 0)) if dados.get("odd_under") else None
-            }
+        odds_1x2 = self._extrair_odds(dados, {"casa": "odd_casa", "empate": "odd_empate", "fora": "odd_fora"})
+        odds_over_under = self._extrair_odds(dados, {"over": "odd_over", "under": "odd_under"})
+        odds_btts = self._extrair_odds(dados, {"sim": "odd_btts_sim", "nao": "odd_btts_nao"})
 
-        # Processa odds BTTS
-        odds_btts = None
-        if dados.get("odd_btts_sim") or dados.get("odd_btts_nao"):
-            odds_btts = {
-                "sim": float(dados.get("odd_btts_sim", 0)) if dados.get("odd_btts_sim") else None,
-                "nao": float(dados.get("odd_btts_nao", 0)) if dados.get("odd_btts_nao") else None
-            }
+        # xG esperado (opcional): com os dois valores a P_c é calculada localmente por Poisson
+        xg_casa = self._extrair_xg(dados, "xg_casa")
+        xg_fora = self._extrair_xg(dados, "xg_fora")
+        if (xg_casa is None) != (xg_fora is None):
+            raise ValueError("Informe o xG esperado dos dois times (ou de nenhum)")
 
         return ConsultaAposta(
             liga=dados["liga"],
@@ -353,575 +1098,312 @@ AGORA, INICIE A ANÁLISE SEGUINDO RIGOROSAMENTE OS 5 PASSOS CoT:
             odds_1x2=odds_1x2,
             odds_over_under=odds_over_under,
             odds_btts=odds_btts,
-            contexto_adicional=dados.get("contexto_adicional")
+            contexto_adicional=dados.get("contexto_adicional"),
+            xg_casa=xg_casa,
+            xg_fora=xg_fora
         )
 
-def criar_analista_instance(api_key: str):
-    """Cria a instância global do Analista Quantitativo"""
+def criar_analista_instance(api_key: str, cache_compartilhado: Optional[Cache] = None):
+    """Cria a instância global do Analista Quantitativo (uma única vez por processo)"""
     global analista_instance
-    analista_instance = AnalistaQuantitativoXG(api_key)
-    print("✅ Analista Quantitativo XG (Gemini) inicializado com sucesso!")
+    if analista_instance is None:
+        with _analista_lock:
+            if analista_instance is None:
+                analista_instance = AnalistaQuantitativoXG(api_key, cache_compartilhado)
+                print("✅ Analista Quantitativo XG (Gemini) inicializado com sucesso!")
+                threading.Thread(target=analista_instance.aquecer_clientes, name="analista-warmup", daemon=True).start()
+    return analista_instance
 
 
 # ============================================================================
 # ROTAS FLASK
-# (O código HTML gigante da rota / foi omitido por brevidade,
-# mas ele deve estar aqui, exatamente como antes)
+# (O HTML da rota / fica em templates/home.html; CSS e JS em static/)
 # ============================================================================
 
+class _OrjsonProvider(JSONProvider):
+    """JSON do Flask (jsonify, request.get_json) também pelo orjson"""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+
+    def loads(self, s: Any, **kwargs: Any) -> Any:
+        return orjson.loads(s)
+
+
+app.json = _OrjsonProvider(app)
+
+
+def _resposta_json(dados: Any, status: int = 200) -> Response:
+    """Resposta JSON serializada pelo orjson (em C, com suporte nativo a datetime)"""
+    return app.response_class(orjson.dumps(dados), status=status, mimetype="application/json")
+
+
+def _ler_json() -> Any:
+    """Corpo da requisição decodificado pelo orjson (JSON inválido vira ValueError, ou seja, 400)"""
+    return orjson.loads(request.get_data(cache=False))
+
+
+def _comprimir(conteudo: bytes) -> Dict[str, bytes]:
+    """Variantes pré-comprimidas de um arquivo, em ordem de preferência (brotli, se disponível, e gzip)"""
+    variantes = {"br": brotli.compress(conteudo, quality=11)} if brotli is not None else {}
+    variantes["gzip"] = gzip.compress(conteudo, 9)
+    return variantes
+
+
+def _url_estatico(nome: str) -> str:
+    """URL de um arquivo de static/ com o hash do conteúdo (cache-busting)"""
+    conteudo = (pathlib.Path(app.static_folder) / nome).read_bytes()
+    return f"/static/{nome}?v={hashlib.md5(conteudo).hexdigest()[:8]}"
+
+
+# CSS do formulário (acima da dobra) vai inline; o do painel de resultado carrega sem bloquear a pintura
+_CSS_CRITICO = (pathlib.Path(app.static_folder) / "app.css").read_text(encoding="utf-8")
+_URL_CSS_POS = _url_estatico("app.post.css")
+_URL_JS = _url_estatico("app.js")
+
+# Página inicial: templates/home.html é renderizado, codificado e tem o ETag calculado uma única vez
+_HOME_HTML = app.jinja_env.get_template("home.html").render(css_critico=_CSS_CRITICO, url_css_pos=_URL_CSS_POS, url_js=_URL_JS)
+if minify_html is not None:
+    # Sem espaços de indentação/comentários (inclusive CSS e JS inline), antes da compressão
+    _HOME_HTML = minify_html.minify(_HOME_HTML, minify_css=True, minify_js=True)
+_HOME_HTML = _HOME_HTML.encode("utf-8")
+# Variantes pré-comprimidas, em ordem de preferência (nenhuma compressão por requisição)
+_HOME_COMPRIMIDO = _comprimir(_HOME_HTML)
+# ETag forte por variante (bytes diferentes não podem compartilhar um validador forte)
+_HOME_ETAG = hashlib.sha1(_HOME_HTML).hexdigest()
+_HOME_ETAGS = {None: _HOME_ETAG, **{cod: f"{_HOME_ETAG}-{cod}" for cod in _HOME_COMPRIMIDO}}
+
+
 @app.route("/", methods=["GET"])
 def home():
     """Interface HTML do Analista Quantitativo XG"""
-    # (O conteúdo desta função permanece o mesmo)
-    return """
-    <!DOCTYPE html>
-<html lang="pt-BR">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>📊 Analista Quantitativo XG - Alpha Quant</title>
-    <style>
-        * {
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }
-        
-        body {
-            font-family: 'Inter', 'Segoe UI', system-ui, sans-serif;
-            background: linear-gradient(135deg, #0f2027 0%, #203a43 50%, #2c5364 100%);
-            min-height: 100vh;
-            padding: 20px;
-        }
-        
-        .container {
-            max-width: 1100px;
-            margin: 0 auto;
-            background: rgba(255, 255, 255, 0.98);
-            border-radius: 20px;
-            padding: 40px;
-            box-shadow: 0 20px 60px rgba(0,0,0,0.3);
-        }
-        
-        .header {
-            text-align: center;
-            margin-bottom: 35px;
-            border-bottom: 3px solid #0f2027;
-            padding-bottom: 25px;
-        }
-        
-        .header h1 {
-            color: #0f2027;
-            font-size: 2.5em;
-            font-weight: 800;
-            margin-bottom: 10px;
-            letter-spacing: -1px;
-        }
-        
-        .header .subtitle {
-            color: #2c5364;
-            font-size: 1.1em;
-            font-weight: 600;
-            font-style: italic;
-        }
-        
-        .badge {
-            display: inline-block;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            color: white;
-            padding: 8px 16px;
-            border-radius: 20px;
-            font-size: 0.85em;
-            font-weight: 600;
-            margin-top: 10px;
-        }
-        
-        .info-cards {
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(250px, 1fr));
-            gap: 15px;
-            margin-bottom: 30px;
-        }
-        
-        .info-card {
-            background: linear-gradient(135deg, #667eea15 0%, #764ba215 100%);
-            border-left: 4px solid #667eea;
-            padding: 15px;
-            border-radius: 10px;
-        }
-        
-        .info-card h3 {
-            color: #0f2027;
-            font-size: 0.9em;
-            margin-bottom: 5px;
-            text-transform: uppercase;
-            letter-spacing: 0.5px;
-        }
-        
-        .info-card p {
-            color: #555;
-            font-size: 0.85em;
-            line-height: 1.4;
-        }
-        
-        .form-section {
-            background: #f8f9fa;
-            padding: 25px;
-            border-radius: 15px;
-            margin-bottom: 25px;
-        }
-        
-        .form-section h2 {
-            color: #0f2027;
-            font-size: 1.3em;
-            margin-bottom: 20px;
-            display: flex;
-            align-items: center;
-            gap: 10px;
-        }
-        
-        .form-grid {
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(250px, 1fr));
-            gap: 20px;
-        }
-        
-        .form-group {
-            margin-bottom: 20px;
-        }
-        
-        .form-group label {
-            display: block;
-            margin-bottom: 8px;
-            font-weight: 600;
-            color: #2c5364;
-            font-size: 0.95em;
-        }
-        
-        .form-group input,
-        .form-group select,
-        .form-group textarea {
-            width: 100%;
-            padding: 12px;
-            border: 2px solid #e0e0e0;
-            border-radius: 8px;
-            font-size: 0.95em;
-            transition: all 0.3s ease;
-            background: white;
-        }
-        
-        .form-group input:focus,
-        .form-group select:focus,
-        .form-group textarea:focus {
-            border-color: #667eea;
-            outline: none;
-            box-shadow: 0 0 0 3px rgba(102, 126, 234, 0.1);
-        }
-        
-        .form-group textarea {
-            resize: vertical;
-            min-height: 80px;
-        }
-        
-        .odds-section {
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(300px, 1fr));
-            gap: 20px;
-        }
-        
-        .odds-group {
-            background: white;
-            padding: 20px;
-            border-radius: 10px;
-            border: 2px solid #e0e0e0;
-        }
-        
-        .odds-group h3 {
-            color: #0f2027;
-            font-size: 1em;
-            margin-bottom: 15px;
-            text-transform: uppercase;
-            letter-spacing: 0.5px;
-        }
-        
-        .odds-inputs {
-            display: grid;
-            gap: 12px;
-        }
-        
-        .btn-submit {
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            color: white;
-            padding: 16px 40px;
-            border: none;
-            border-radius: 10px;
-            font-size: 1.1em;
-            font-weight: 700;
-            cursor: pointer;
-            width: 100%;
-            transition: all 0.3s ease;
-            text-transform: uppercase;
-            letter-spacing: 1px;
-        }
-        
-        .btn-submit:hover {
-            transform: translateY(-2px);
-            box-shadow: 0 10px 25px rgba(102, 126, 234, 0.4);
-        }
-        
-        .btn-submit:disabled {
-            background: #95a5a6;
-            cursor: not-allowed;
-            transform: none;
-        }
-        
-        .resultado {
-            margin-top: 30px;
-            padding: 30px;
-            background: linear-gradient(135deg, #f8f9fa 0%, #e9ecef 100%);
-            border-radius: 15px;
-            border-left: 6px solid #28a745;
-            display: none;
-        }
-        
-        .resultado.erro {
-            border-left-color: #dc3545;
-            background: linear-gradient(135deg, #fff5f5 0%, #ffe0e0 100%);
-        }
-        
-        .resultado h3 {
-            color: #0f2027;
-            font-size: 1.4em;
-            margin-bottom: 20px;
-        }
-        
-        .analise-content {
-            background: white;
-            padding: 25px;
-            border-radius: 10px;
-            white-space: pre-line;
-            line-height: 1.8;
-            font-size: 0.95em;
-            color: #333;
-            max-height: 600px;
-            overflow-y: auto;
-        }
-        
-        .metadata {
-            margin-top: 20px;
-            padding: 20px;
-            background: rgba(255,255,255,0.6);
-            border-radius: 10px;
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
-            gap: 15px;
-            font-size: 0.85em;
-        }
-        
-        .metadata-item {
-            display: flex;
-            flex-direction: column;
-        }
-        
-        .metadata-item strong {
-            color: #667eea;
-            margin-bottom: 5px;
-        }
-        
-        .loading {
-            text-align: center;
-            color: #667eea;
-            font-size: 1.1em;
-            padding: 40px;
-        }
-        
-        .disclaimer-box {
-            background: #fff3cd;
-            border: 2px solid #ffc107;
-            border-radius: 10px;
-            padding: 20px;
-            margin-top: 20px;
-        }
-        
-        .disclaimer-box h4 {
-            color: #856404;
-            margin-bottom: 10px;
-        }
-        
-        .disclaimer-box p {
-            color: #856404;
-            font-size: 0.9em;
-            line-height: 1.6;
-        }
+    corpo, codificacao = _HOME_HTML, None
+    for candidata, comprimido in _HOME_COMPRIMIDO.items():
+        if request.accept_encodings[candidata]:
+            corpo, codificacao = comprimido, candidata
+            break
+
+    etag = _HOME_ETAGS[codificacao]
+    if request.if_none_match.contains(etag):
+        resposta = Response(status=304)
+    else:
+        resposta = Response(corpo, mimetype="text/html")
+        if codificacao:
+            resposta.content_encoding = codificacao
+    resposta.vary.add("Accept-Encoding")
+    resposta.set_etag(etag)
+    resposta.cache_control.public = True
+    resposta.cache_control.max_age = HOME_CACHE_MAX_AGE
+    return resposta
 
-        @media (max-width: 768px) {
-            .container {
-                padding: 20px;
-            }
-            
-            .header h1 {
-                font-size: 1.8em;
-            }
-            
-            .form-grid,
-            .odds-section {
-                grid-template-columns: 1fr;
-            }
-        }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>📊 Analista Quantitativo XG</h1>
-            <p class="subtitle">Alpha Quant Analyst - Modelagem Preditiva Avançada</p>
-            <span class="badge">Expected Goals (XG) • Chain-of-Thought • +EV Analysis</span>
-        </div>
-
-        <div class="info-cards">
-            <div class="info-card">
-                <h3>🎯 Metodologia</h3>
-                <p>Modelo de Poisson + XG/XA últimas 10 partidas. Análise rigorosa com CoT de 5 passos.</p>
-            </div>
-            <div class="info-card">
-                <h3>💰 Foco em Valor</h3>
-                <p>Identificação exclusiva de Value Bets com EV > 2%. Kelly Criterion para gestão de stake.</p>
-            </div>
-            <div class="info-card">
-                <h3>📈 Fontes P1</h3>
-                <p>UnderStat, FBref, XGScore (prioridade máxima). Simulação RAG com 15+ URLs.</p>
-            </div>
-        </div>
-
-        <form id="consultaForm">
-            <div class="form-section">
-                <h2>⚽ Dados da Partida</h2>
-                <div class="form-grid">
-                    <div class="form-group">
-                        <label for="liga">Liga (ex: Premier League)</label>
-                        <input type="text" id="liga" name="liga" placeholder="Ex: Brasileirão Série A" required>
-                    </div>
-                    <div class="form-group">
-                        <label for="time_casa">Time da Casa</label>
-                        <input type="text" id="time_casa" name="time_casa" placeholder="Ex: Flamengo" required>
-                    </div>
-                    <div class="form-group">
-                        <label for="time_fora">Time Visitante</label>
-                        <input type="text" id="time_fora" name="time_fora" placeholder="Ex: Palmeiras" required>
-                    </div>
-                </div>
-            </div>
-
-            <div class="form-section">
-                <h2>📊 Odds de Mercado (Decimais)</h2>
-                <div class="odds-section">
-                    <div class="odds-group">
-                        <h3>1X2 - Resultado Final</h3>
-                        <div class="odds-inputs">
-                            <div class="form-group">
-                                <label for="odd_casa">Casa (1)</label>
-                                <input type="number" step="0.01" min="1.01" id="odd_casa" name="odd_casa" placeholder="Ex: 2.10">
-                            </div>
-                            <div class="form-group">
-                                <label for="odd_empate">Empate (X)</label>
-                                <input type="number" step="0.01" min="1.01" id="odd_empate" name="odd_empate" placeholder="Ex: 3.40">
-                            </div>
-                            <div class="form-group">
-                                <label for="odd_fora">Fora (2)</label>
-                                <input type="number" step="0.01" min="1.01" id="odd_fora" name="odd_fora" placeholder="Ex: 3.50">
-                            </div>
-                        </div>
-                    </div>
-                    <div class="odds-group">
-                        <h3>Gols e Outros Mercados</h3>
-                        <div class="odds-inputs">
-                            <div class="form-group">
-                                <label for="odd_over">Over 2.5 Gols</label>
-                                <input type="number" step="0.01" min="1.01" id="odd_over" name="odd_over" placeholder="Ex: 1.85">
-                            </div>
-                            <div class="form-group">
-                                <label for="odd_under">Under 2.5 Gols</label>
-                                <input type="number" step="0.01" min="1.01" id="odd_under" name="odd_under" placeholder="Ex: 1.95">
-                            </div>
-                            <div class="form-group">
-                                <label for="odd_btts_sim">Ambos Marcam (Sim)</label>
-                                <input type="number" step="0.01" min="1.01" id="odd_btts_sim" name="odd_btts_sim" placeholder="Ex: 1.70">
-                            </div>
-                             <div class="form-group">
-                                <label for="odd_btts_nao">Ambos Marcam (Não)</label>
-                                <input type="number" step="0.01" min="1.01" id="odd_btts_nao" name="odd_btts_nao" placeholder="Ex: 2.05">
-                            </div>
-                        </div>
-                    </div>
-                </div>
-            </div>
-
-            <div class="form-section">
-                <h2>📝 Contexto Adicional (Opcional)</h2>
-                <div class="form-group">
-                    <label for="contexto_adicional">Informações Adicionais (Lesões, Foco em Copa, Desfalques)</label>
-                    <textarea id="contexto_adicional" name="contexto_adicional" placeholder="Ex: O time da casa jogou 72h atrás pela Copa Libertadores. O artilheiro do time de fora está suspenso."></textarea>
-                </div>
-            </div>
-
-            <button type="submit" class="btn-submit" id="submitBtn">Executar Análise Quantitativa XG</button>
-        </form>
-
-        <div id="loading" class="loading" style="display: none;">
-            <h3>Processando Análise...</h3>
-            <p>O Alpha Quant Analyst está executando o protocolo CoT de 5 passos (Coleta XG, Ajuste Contextual, Cálculo Poisson, Detecção +EV e Gestão de Stake). Isso pode levar até 45 segundos.</p>
-        </div>
-
-        <div id="resultado" class="resultado">
-            <h3 id="resultadoTitle">✅ Análise Concluída</h3>
-            
-            <div class="metadata" id="metadata">
-                <div class="metadata-item"><strong>Partida</strong><span id="metaPartida"></span></div>
-                <div class="metadata-item"><strong>Liga</strong><span id="metaLiga"></span></div>
-                <div class="metadata-item"><strong>Modelo</strong><span id="metaModelo"></span></div>
-                <div class="metadata-item"><strong>Metodologia</strong><span id="metaMetodologia"></span></div>
-                <div class="metadata-item"><strong>Timestamp</strong><span id="metaTimestamp"></span></div>
-            </div>
-            
-            <div class="disclaimer-box">
-                <h4>⚠️ ATENÇÃO: Recomendação do Sistema</h4>
-                <p>O resultado abaixo é a saída bruta do Large Language Model (LLM) seguindo o protocolo quantitativo XG. **Atenção especial** ao 'Passo 5' para a recomendação final de aposta e stake.</p>
-            </div>
-            
-            <div class="analise-content" id="analiseContent">
-                </div>
-        </div>
-    </div>
-    
-    <script>
-        document.getElementById('consultaForm').addEventListener('submit', function(e) {
-            e.preventDefault();
-            
-            const form = e.target;
-            const formData = new FormData(form);
-            const data = {};
-            
-            formData.forEach((value, key) => {
-                if (value.trim() !== "") {
-                    data[key] = value.trim();
-                }
-            });
-            
-            const url = '/analisar_aposta';
-            const loadingDiv = document.getElementById('loading');
-            const resultadoDiv = document.getElementById('resultado');
-            const submitBtn = document.getElementById('submitBtn');
-            
-            loadingDiv.style.display = 'block';
-            resultadoDiv.style.display = 'none';
-            submitBtn.disabled = true;
-            submitBtn.textContent = 'Analisando...';
-
-            // Adiciona um pequeno delay visual antes de fazer o fetch
-            setTimeout(() => {
-                fetch(url, {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json'
-                    },
-                    body: JSON.stringify(data)
-                })
-                .then(response => response.json())
-                .then(result => {
-                    loadingDiv.style.display = 'none';
-                    submitBtn.disabled = false;
-                    submitBtn.textContent = 'Executar Análise Quantitativa XG';
-
-                    if (result.erro) {
-                        resultadoDiv.style.display = 'block';
-                        resultadoDiv.classList.add('erro');
-                        document.getElementById('resultadoTitle').textContent = '❌ Erro na Análise';
-                        document.getElementById('analiseContent').innerHTML = `
-                            <strong>Mensagem de Erro:</strong> ${result.mensagem}<br><br>
-                            <strong>Detalhes:</strong> ${result.detalhes || 'Sem detalhes.'}
-                        `;
-                        document.getElementById('metadata').style.display = 'none';
-                    } else {
-                        resultadoDiv.style.display = 'block';
-                        resultadoDiv.classList.remove('erro');
-                        document.getElementById('resultadoTitle').textContent = '✅ Análise Concluída';
-                        document.getElementById('metadata').style.display = 'grid';
-
-                        // Injetar Metadados
-                        document.getElementById('metaPartida').textContent = result.partida;
-                        document.getElementById('metaLiga').textContent = result.liga;
-                        document.getElementById('metaModelo').textContent = result.modelo_usado;
-                        document.getElementById('metaMetodologia').textContent = result.metodologia;
-                        document.getElementById('metaTimestamp').textContent = new Date(result.timestamp).toLocaleString('pt-BR');
-                        
-                        // Injetar Conteúdo da Análise
-                        const rawContent = result.analise_completa;
-                        const formattedContent = rawContent.replace(/\\n/g, '<br>').replace(/<COT_STEP_(\d): (.+?)>/g, '<h4>📌 Passo $1: $2</h4>');
-                        document.getElementById('analiseContent').innerHTML = formattedContent;
-                    }
-                })
-                .catch(error => {
-                    loadingDiv.style.display = 'none';
-                    submitBtn.disabled = false;
-                    submitBtn.textContent = 'Executar Análise Quantitativa XG';
-
-                    resultadoDiv.style.display = 'block';
-                    resultadoDiv.classList.add('erro');
-                    document.getElementById('resultadoTitle').textContent = '❌ Erro de Comunicação';
-                    document.getElementById('analiseContent').innerHTML = `
-                        <strong>Detalhes:</strong> Falha ao se comunicar com o servidor de análise. ${error.message}
-                    `;
-                    document.getElementById('metadata').style.display = 'none';
-                });
-            }, 100); // 100ms delay para melhor UX
-        });
-    </script>
-</body>
-</html>
+def _evento_sse(dados: Dict[str, Any], evento: Optional[str] = None) -> str:
+    linha_evento = f"event: {evento}\n" if evento else ""
+    return f"{linha_evento}data: {orjson.dumps(dados).decode('utf-8')}\n\n"
+
+
+def _resposta_stream(analista: AnalistaQuantitativoXG, consulta: ConsultaAposta) -> Response:
     """
+    Transmite a análise via Server-Sent Events: 'meta' (partida, modelo, timestamp),
+    um evento por pedaço de texto ({"delta": ...}) e por fim 'fim' ou 'erro'.
+    """
+    def gerar_eventos():
+        try:
+            modelo, partes = analista.stream_consulta(consulta)
+            yield _evento_sse(analista.metadados_resultado(consulta, modelo), "meta")
+            for texto in partes:
+                yield _evento_sse({"delta": texto})
+            yield _evento_sse({}, "fim")
+        except Exception as e:
+            analista.logger.error("Erro durante o stream da análise: %s", e)
+            yield _evento_sse({"erro": True, "mensagem": "Erro ao gerar a análise", "detalhes": str(e)}, "erro")
+
+    return Response(
+        stream_with_context(gerar_eventos()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# As rotas abaixo respondem com erro até o analista ser criado; a partir daí
+# inicializar_app() troca cada view pelo handler com o analista já vinculado
+# (functools.partial), sem 'global' nem checagem de None a cada requisição.
+def _analista_nao_inicializado():
+    return _resposta_json({"erro": True, "mensagem": "Analista não inicializado", "detalhes": "A chave da API pode estar faltando ou o Analista não foi criado na inicialização."}, 500)
+
 
 @app.route("/analisar_aposta", methods=["POST"])
 def analisar_aposta():
-    """Endpoint para executar a análise quantitativa"""
-    global analista_instance
-    
-    # O check agora vai funcionar. Se a inicialização falhou (ex: chave errada)
-    # o analista_instance ainda será None, e o erro será o mesmo, o que é bom.
-    if analista_instance is None:
-        return jsonify({"erro": True, "mensagem": "Analista não inicializado", "detalhes": "A chave da API pode estar faltando ou o Analista não foi criado na inicialização."}), 500
+    """
+    Endpoint para executar a análise quantitativa.
+    Com 'Accept: text/event-stream' a análise é transmitida via SSE; senão, JSON completo.
+    """
+    return _analista_nao_inicializado()
+
+@app.route("/analisar_stream", methods=["POST"])
+def analisar_stream():
+    """Endpoint que sempre transmite a análise via Server-Sent Events enquanto o Gemini gera"""
+    return _analista_nao_inicializado()
+
+@app.route("/analisar_batch", methods=["POST"])
+def analisar_batch():
+    """Endpoint para analisar várias partidas em paralelo"""
+    return _analista_nao_inicializado()
+
+
+def _analisar_aposta(analista: AnalistaQuantitativoXG):
+    try:
+        dados = _ler_json()
+        consulta = analista.validar_contexto_consulta(dados)
+        if request.accept_mimetypes.best_match(["application/json", "text/event-stream"]) == "text/event-stream":
+            return _resposta_stream(analista, consulta)
+        resultado_analise = analista.processar_consulta(consulta)
+        return _resposta_json(resultado_analise)
+    except ValueError as e:
+        analista.logger.error("Erro de validação: %s", e)
+        return _resposta_json({"erro": True, "mensagem": "Dados de entrada inválidos", "detalhes": str(e)}, 400)
+    except Exception as e:
+        analista.logger.error("Erro inesperado na rota: %s", e)
+        return _resposta_json({"erro": True, "mensagem": "Erro interno do servidor", "detalhes": str(e)}, 500)
+
+def _analisar_stream(analista: AnalistaQuantitativoXG):
+    try:
+        dados = _ler_json()
+        consulta = analista.validar_contexto_consulta(dados)
+    except ValueError as e:
+        analista.logger.error("Erro de validação: %s", e)
+        return _resposta_json({"erro": True, "mensagem": "Dados de entrada inválidos", "detalhes": str(e)}, 400)
+
+    return _resposta_stream(analista, consulta)
 
+def _analisar_batch(analista: AnalistaQuantitativoXG):
     try:
-        dados = request.get_json()
-        consulta = analista_instance.validar_contexto_consulta(dados)
-        resultado_analise = analista_instance.processar_consulta(consulta)
-        return jsonify(resultado_analise)
+        dados = _ler_json()
+        itens = dados.get("consultas") if isinstance(dados, dict) else dados
+        if not isinstance(itens, list) or not itens:
+            raise ValueError("Envie uma lista não vazia de consultas em 'consultas'")
+        if len(itens) > BATCH_TAMANHO_MAXIMO:
+            raise ValueError(f"Máximo de {BATCH_TAMANHO_MAXIMO} consultas por lote")
+
+        consultas = []
+        for indice, item in enumerate(itens):
+            if not isinstance(item, dict):
+                raise ValueError(f"Consulta {indice}: formato inválido")
+            try:
+                consultas.append(analista.validar_contexto_consulta(item))
+            except ValueError as e:
+                raise ValueError(f"Consulta {indice}: {e}") from e
+
+        resultados = analista.processar_lote(consultas)
+        return _resposta_json({"resultados": resultados})
     except ValueError as e:
-        analista_instance.logger.error(f"Erro de validação: {str(e)}")
-        return jsonify({"erro": True, "mensagem": "Dados de entrada inválidos", "detalhes": str(e)}), 400
+        analista.logger.error("Erro de validação: %s", e)
+        return _resposta_json({"erro": True, "mensagem": "Dados de entrada inválidos", "detalhes": str(e)}, 400)
+    except TimeoutError as e:
+        analista.logger.error("Lote excedeu o tempo limite: %s", e)
+        return _resposta_json({"erro": True, "mensagem": "Tempo limite do lote excedido", "detalhes": str(e)}, 504)
     except Exception as e:
-        analista_instance.logger.error(f"Erro inesperado na rota: {str(e)}")
-        return jsonify({"erro": True, "mensagem": "Erro interno do servidor", "detalhes": str(e)}), 500
+        analista.logger.error("Erro inesperado na rota: %s", e)
+        return _resposta_json({"erro": True, "mensagem": "Erro interno do servidor", "detalhes": str(e)}, 500)
+
+
+def _vincular_analista(analista: AnalistaQuantitativoXG):
+    """Substitui as views das rotas de análise pelos handlers com o analista vinculado"""
+    for endpoint, handler in (
+        ("analisar_aposta", _analisar_aposta),
+        ("analisar_stream", _analisar_stream),
+        ("analisar_batch", _analisar_batch),
+    ):
+        app.view_functions[endpoint] = partial(handler, analista)
+
+
+@app.cli.command("analisar-lote-diferido")
+@click.argument("entrada", type=click.File("r", encoding="utf-8"))
+@click.argument("saida", type=click.File("w", encoding="utf-8"))
+def analisar_lote_diferido(entrada, saida):
+    """Analisa um arquivo JSON (lista de consultas) via Batch Mode do Gemini."""
+    inicializar_app()
+    if analista_instance is None:
+        raise click.ClickException("Analista não inicializado (verifique a chave de API).")
+
+    try:
+        itens = orjson.loads(entrada.read())
+    except orjson.JSONDecodeError as e:
+        raise click.ClickException(f"JSON inválido: {e}")
+    if not isinstance(itens, list) or not itens:
+        raise click.ClickException("O arquivo deve conter uma lista não vazia de consultas")
+
+    consultas = []
+    for indice, item in enumerate(itens):
+        if not isinstance(item, dict):
+            raise click.ClickException(f"Consulta {indice}: formato inválido")
+        try:
+            consultas.append(analista_instance.validar_contexto_consulta(item))
+        except ValueError as e:
+            raise click.ClickException(f"Consulta {indice}: {e}")
+    resultados = analista_instance.processar_lote_diferido(consultas)
+    saida.write(orjson.dumps(resultados, option=orjson.OPT_INDENT_2).decode("utf-8"))
+
+
+@app.cli.command("exportar-site")
+@click.argument("destino", type=click.Path(file_okay=False, path_type=pathlib.Path))
+def exportar_site(destino):
+    """
+    Grava index.html e static/ (com irmãos .gz) em DESTINO para o nginx/CDN servir sem passar pelo Flask.
+    Só gzip: o nginx padrão tem gzip_static, mas não brotli_static (módulo à parte).
+    """
+    destino.mkdir(parents=True, exist_ok=True)
+    (destino / "index.html").write_bytes(_HOME_HTML)
+    (destino / "index.html.gz").write_bytes(_HOME_COMPRIMIDO["gzip"])
+
+    (destino / "static").mkdir(exist_ok=True)
+    for origem in pathlib.Path(app.static_folder).iterdir():
+        if not origem.is_file():
+            continue
+        conteudo = origem.read_bytes()
+        (destino / "static" / origem.name).write_bytes(conteudo)
+        (destino / "static" / f"{origem.name}.gz").write_bytes(gzip.compress(conteudo, 9))
+    click.echo(f"Site exportado em {destino}")
 
 
 # ### MUDANÇA (Início): LÓGICA DE INICIALIZAÇÃO MOVIDA PARA CIMA ###
-# Esta lógica agora é executada quando o Gunicorn importa o app.
-def inicializar_app():
-    """Carrega a API Key e inicializa o analista."""
-    global analista_instance
+# Chamada por wsgi.py (cada worker do Gunicorn), pelo __main__ e pelo comando de lote diferido.
+# Importar o módulo não toca no Gemini: 'flask --app app exportar-site' só gera o site estático.
+def _carregar_chave_api() -> Optional[str]:
+    """Carrega o .env e retorna a GOOGLE_API_KEY (None se ausente ou ainda com o valor de exemplo)"""
+    from dotenv import load_dotenv
+
+    # Carrega as variáveis do arquivo .env (como GOOGLE_API_KEY e REDIS_URL)
+    load_dotenv()
     GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-
     if not GOOGLE_API_KEY or GOOGLE_API_KEY == "SUA_CHAVE_API_DO_GEMINI_AQUI":
         print("❌ ERRO CRÍTICO: Chave da API 'GOOGLE_API_KEY' não configurada no .env ou nas variáveis de ambiente.")
-    else:
+        return None
+    return GOOGLE_API_KEY
+
+
+def inicializar_app():
+    """Carrega a API Key e inicializa o analista (uma única vez por processo)."""
+    global analista_instance
+    if analista_instance is not None:
+        return
+    GOOGLE_API_KEY = _carregar_chave_api()
+
+    # Cache compartilhado de análises: Redis entre workers; sem REDIS_URL fica só o cache local do analista
+    REDIS_URL = os.getenv("REDIS_URL")
+    if REDIS_URL:
+        cache.init_app(app, config={
+            "CACHE_TYPE": "RedisCache",
+            "CACHE_REDIS_URL": REDIS_URL,
+            "CACHE_DEFAULT_TIMEOUT": CACHE_COMPARTILHADO_TTL_SEGUNDOS
+        })
+
+    if GOOGLE_API_KEY:
         try:
-            # Isso vai definir a variável global 'analista_instance'
-            criar_analista_instance(GOOGLE_API_KEY)
+            # Isso vai definir a variável global 'analista_instance' e ligá-la às rotas
+            _vincular_analista(criar_analista_instance(GOOGLE_API_KEY, cache if REDIS_URL else None))
         except Exception as e:
             print(f"❌ FALHA na inicialização do analista: {e}")
-            # analista_instance continuará None, e a API retornará o erro correto
-
-# Executa a inicialização
-inicializar_app()
+            # analista_instance continuará None, e as rotas retornarão o erro correto
 # ### MUDANÇA (Fim) ###
 
 
@@ -931,16 +1413,35 @@ inicializar_app()
 
 # ### MUDANÇA (Início): Bloco __main__ simplificado ###
 # Este bloco agora é usado *apenas* para rodar localmente (python app.py)
-# A inicialização do analista já aconteceu lá em cima.
+# A inicialização do analista acontece aqui, e não na importação do módulo.
 if __name__ == "__main__":
-    if analista_instance is None:
+    if _carregar_chave_api() is None:
         print("❌ Servidor não pode iniciar. Falha ao inicializar o analista (verifique a chave de API).")
-    else:
-        # 3. Iniciar o servidor Flask localmente
+    elif os.name != "nt":
         print("===================================================================")
-        print("🚀 Servidor Alpha Quant Analyst (GEMINI) iniciado localmente.")
+        print("🚀 Servidor Alpha Quant Analyst (GEMINI) iniciando via gunicorn.")
         print("Acesse a interface no seu navegador:")
         print(f"   👉 http://127.0.0.1:5000")
+        print("Equivale a: gunicorn -c gunicorn_conf.py wsgi:app")
         print("===================================================================")
-        app.run(debug=True, port=5000)
+        # Substitui este processo pelo gunicorn (workers gevent com SO_REUSEPORT, ver gunicorn_conf.py)
+        # antes de criar qualquer analista: cada worker cria o próprio via wsgi.py, depois do fork
+        raiz = pathlib.Path(__file__).resolve().parent
+        os.execv(sys.executable, [
+            sys.executable, "-m", "gunicorn",
+            "--chdir", str(raiz), "-c", str(raiz / "gunicorn_conf.py"), "wsgi:app"
+        ])
+    else:
+        # Windows (gunicorn não roda): servidor de desenvolvimento do Flask, um processo só
+        inicializar_app()
+        if analista_instance is None:
+            print("❌ Servidor não pode iniciar. Falha ao inicializar o analista (verifique a chave de API).")
+        else:
+            print("===================================================================")
+            print("🚀 Servidor Alpha Quant Analyst (GEMINI) iniciado localmente.")
+            print("Acesse a interface no seu navegador:")
+            print(f"   👉 http://127.0.0.1:5000")
+            print("===================================================================")
+            # Sem debug: o reloader importaria o app duas vezes (dois analistas, dois Context Caches)
+            app.run(port=5000, threaded=True)
 # ### MUDANÇA (Fim) ###
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""
+Configuração do Gunicorn para o Analista Quantitativo XG.
+
+Uso: gunicorn -c gunicorn_conf.py wsgi:app
+
+Workers gevent: enquanto uma análise espera o Gemini (até ~45s), o mesmo
+worker continua atendendo a página inicial e as demais requisições.
+"""
+
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+# SO_REUSEPORT: cada worker tem o próprio socket/fila de accept e o kernel distribui as conexões.
+# Só em TCP: num socket unix (atrás do nginx) o bind por worker falha ou sobrescreve o arquivo
+reuse_port = not bind.startswith("unix:")
+worker_class = "gevent"
+workers = int(os.getenv("GUNICORN_WORKERS", (os.cpu_count() or 1) * 2))
+worker_connections = 1000
+keepalive = 30
+# Análises longas (CoT de 5 passos, possível reprocessamento no Pro) não podem derrubar o worker
+timeout = 120
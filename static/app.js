@@ -0,0 +1,133 @@
+// Quebras de linha e marcadores de passo convertidos numa única passada
+const RE_FORMATACAO = /\n|<COT_STEP_(\d): (.+?)>/g;
+
+function formatarAnalise(rawContent) {
+    return rawContent.replace(RE_FORMATACAO, (m, passo, titulo) => m === '\n' ? '<br>' : `<h4>📌 Passo ${passo}: ${titulo}</h4>`);
+}
+
+function mostrarErro(titulo, html) {
+    const resultadoDiv = document.getElementById('resultado');
+    resultadoDiv.style.display = 'block';
+    resultadoDiv.classList.add('erro');
+    document.getElementById('resultadoTitle').textContent = titulo;
+    document.getElementById('analiseContent').innerHTML = html;
+    document.getElementById('metadata').style.display = 'none';
+}
+
+function mostrarMetadados(meta) {
+    const resultadoDiv = document.getElementById('resultado');
+    resultadoDiv.style.display = 'block';
+    resultadoDiv.classList.remove('erro');
+    document.getElementById('resultadoTitle').textContent = '⏳ Gerando Análise...';
+    document.getElementById('metadata').style.display = 'grid';
+
+    // Injetar Metadados
+    document.getElementById('metaPartida').textContent = meta.partida;
+    document.getElementById('metaLiga').textContent = meta.liga;
+    document.getElementById('metaModelo').textContent = meta.modelo_usado;
+    document.getElementById('metaMetodologia').textContent = meta.metodologia;
+    document.getElementById('metaTimestamp').textContent = new Date(meta.timestamp).toLocaleString('pt-BR');
+}
+
+// Lê o corpo da resposta SSE conforme chega, separando os eventos por linha em branco
+async function lerEventos(response, aoReceberEvento) {
+    const reader = response.body.getReader();
+    const dec = new TextDecoder();
+    let buf = '';
+
+    while (true) {
+        const {value, done} = await reader.read();
+        if (done) break;
+        buf += dec.decode(value, {stream: true});
+
+        let fim;
+        while ((fim = buf.indexOf('\n\n')) !== -1) {
+            const bloco = buf.slice(0, fim);
+            buf = buf.slice(fim + 2);
+
+            let evento = 'message';
+            let dados = '';
+            bloco.split('\n').forEach(linha => {
+                if (linha.startsWith('event: ')) evento = linha.slice(7);
+                else if (linha.startsWith('data: ')) dados += linha.slice(6);
+            });
+            aoReceberEvento(evento, dados ? JSON.parse(dados) : {});
+        }
+    }
+}
+
+document.getElementById('consultaForm').addEventListener('submit', async function(e) {
+    e.preventDefault();
+
+    const form = e.target;
+    const formData = new FormData(form);
+    const data = {};
+
+    formData.forEach((value, key) => {
+        if (value.trim() !== "") {
+            data[key] = value.trim();
+        }
+    });
+
+    const url = '/analisar_aposta';
+    const loadingDiv = document.getElementById('loading');
+    const resultadoDiv = document.getElementById('resultado');
+    const submitBtn = document.getElementById('submitBtn');
+    const analiseContent = document.getElementById('analiseContent');
+
+    loadingDiv.style.display = 'block';
+    resultadoDiv.style.display = 'none';
+    submitBtn.disabled = true;
+    submitBtn.textContent = 'Analisando...';
+
+    try {
+        const response = await fetch(url, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Accept': 'text/event-stream'
+            },
+            body: JSON.stringify(data)
+        });
+
+        // Erros de validação/inicialização continuam vindo como JSON
+        if (!(response.headers.get('Content-Type') || '').startsWith('text/event-stream')) {
+            const result = await response.json();
+            loadingDiv.style.display = 'none';
+            mostrarErro('❌ Erro na Análise', `
+                <strong>Mensagem de Erro:</strong> ${result.mensagem}<br><br>
+                <strong>Detalhes:</strong> ${result.detalhes || 'Sem detalhes.'}
+            `);
+            return;
+        }
+
+        let rawContent = '';
+        await lerEventos(response, (evento, dados) => {
+            if (evento === 'meta') {
+                loadingDiv.style.display = 'none';
+                mostrarMetadados(dados);
+                analiseContent.innerHTML = '';
+            } else if (evento === 'fim') {
+                document.getElementById('resultadoTitle').textContent = '✅ Análise Concluída';
+            } else if (evento === 'erro') {
+                loadingDiv.style.display = 'none';
+                mostrarErro('❌ Erro na Análise', `
+                    <strong>Mensagem de Erro:</strong> ${dados.mensagem}<br><br>
+                    <strong>Detalhes:</strong> ${dados.detalhes || 'Sem detalhes.'}
+                `);
+            } else if (dados.delta !== undefined) {
+                // Injetar Conteúdo da Análise à medida que chega
+                rawContent += dados.delta;
+                analiseContent.innerHTML = formatarAnalise(rawContent);
+            }
+        });
+    } catch (error) {
+        loadingDiv.style.display = 'none';
+        mostrarErro('❌ Erro de Comunicação', `
+            <strong>Detalhes:</strong> Falha ao se comunicar com o servidor de análise. ${error.message}
+        `);
+    } finally {
+        submitBtn.disabled = false;
+        submitBtn.textContent = 'Executar Análise Quantitativa XG';
+    }
+});
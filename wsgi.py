@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+"""Ponto de entrada WSGI: gunicorn -c gunicorn_conf.py wsgi:app"""
+
+import sys
+
+# O cliente gRPC do Gemini precisa cooperar com o hub do gevent: init_gevent() vem depois do
+# monkey-patch da stdlib (feito pelo worker gevent em init_process) e antes de qualquer objeto gRPC
+if "gevent.monkey" in sys.modules and sys.modules["gevent.monkey"].is_module_patched("socket"):
+    from grpc.experimental import gevent as grpc_gevent
+
+    grpc_gevent.init_gevent()
+
+from app import app, inicializar_app
+
+# Analista (Gemini) criado só aqui, ao subir o servidor; os comandos do Flask CLI não passam por este módulo
+inicializar_app()
+
+__all__ = ["app"]